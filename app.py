@@ -1,32 +1,117 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, g
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
 from flask_cors import CORS
+import orjson
 from sheets_client import SheetsClient
+from submit_parse import parse_orders
 import os
 import time
-from collections import defaultdict
 from collections import deque
+from functools import wraps
 import hashlib
-_recent_submissions = deque(maxlen=200)
+import threading
 DEDUP_WINDOW = 5  # seconds
+# Two generations of fingerprint -> ts; rotated every DEDUP_WINDOW so
+# anything older than two windows is dropped wholesale.
+_dedup_current = {}
+_dedup_previous = {}
+_dedup_rotated = time.monotonic()
+_dedup_lock = threading.Lock()
+
+
+def _seen_recently(fingerprint):
+    """Records fingerprint; True if it was already seen within DEDUP_WINDOW."""
+    global _dedup_current, _dedup_previous, _dedup_rotated
+
+    with _dedup_lock:
+        now = time.monotonic()
+
+        if now - _dedup_rotated >= DEDUP_WINDOW:
+            stale = now - _dedup_rotated >= 2 * DEDUP_WINDOW
+            _dedup_previous = {} if stale else _dedup_current
+            _dedup_current = {}
+            _dedup_rotated = now
+
+        ts = _dedup_current.get(fingerprint, _dedup_previous.get(fingerprint))
+        if ts is not None and now - ts < DEDUP_WINDOW:
+            return True
+
+        _dedup_current[fingerprint] = now
+        return False
+
+
+def _forget(fingerprint):
+    """Drops fingerprint so an identical resubmission is not deduplicated."""
+    with _dedup_lock:
+        _dedup_current.pop(fingerprint, None)
+        _dedup_previous.pop(fingerprint, None)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Parses request bodies and renders jsonify() output with orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj, default=self.default, option=orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+class _ListBodyCache:
+    """
+    flask-compress cache backend. Keeps compressed product/company payloads
+    keyed by "<encoding>;<payload etag>" so each list version is compressed
+    once per encoding; other responses have an empty key and are not kept.
+    """
+
+    MAX_ENTRIES = 16
+
+    def __init__(self):
+        self._bodies = {}
+
+    def get(self, key):
+        return self._bodies.get(key)
+
+    def set(self, key, value):
+        if key.endswith(";"):
+            return
+        if len(self._bodies) >= self.MAX_ENTRIES and key not in self._bodies:
+            self._bodies.clear()  # stale list versions; refilled on demand
+        self._bodies[key] = value
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+app.config["COMPRESS_MIN_SIZE"] = 1024  # bytes; smaller bodies go out as-is
+app.config["COMPRESS_STREAMS"] = True   # streamed pivot too (streaming algorithms, no gzip)
+app.config["COMPRESS_CACHE_BACKEND"] = _ListBodyCache
+app.config["COMPRESS_CACHE_KEY"] = lambda req: g.get("list_etag", "")
+Compress(app)
 app.secret_key = os.environ.get("FLASK_SECRET", "dev-secret-change-me")
-_rate_limit = defaultdict(list)
 RATE_LIMIT = 30  # requests
 WINDOW = 60      # seconds
+RATE_LIMIT_SHARDS = 64  # power of two; keys hash onto this many fixed windows
+_rate_limit = [deque(maxlen=RATE_LIMIT) for _ in range(RATE_LIMIT_SHARDS)]
+_rate_limit_lock = threading.Lock()
 def rate_limited(key):
-    now = time.time()
-    window = _rate_limit[key]
+    now = time.monotonic()
+    hits = _rate_limit[hash(key) & (RATE_LIMIT_SHARDS - 1)]
 
-    # remove old
-    _rate_limit[key] = [t for t in window if now - t < WINDOW]
+    with _rate_limit_lock:
+        # remove old
+        while hits and now - hits[0] >= WINDOW:
+            hits.popleft()
 
-    if len(_rate_limit[key]) >= RATE_LIMIT:
-        return True
+        if len(hits) >= RATE_LIMIT:
+            return True
 
-    _rate_limit[key].append(now)
-    return False
+        hits.append(now)
+        return False
 
 # Initialize Sheets client
 try:
@@ -35,12 +120,35 @@ except Exception as e:
     sheets = None
     print("Sheets init failed:", e)
 
+
+def requires_sheets(fallback):
+    """
+    Serves fallback() instead of the view when the Sheets client failed to
+    initialize. Decided once at import, so healthy routes carry no check.
+    """
+    def decorator(view):
+        if sheets is not None:
+            return view
+
+        @wraps(view)
+        def unavailable(*args, **kwargs):
+            return fallback()
+        return unavailable
+    return decorator
+
+
+def _unavailable_json(**payload):
+    return lambda: jsonify(payload)
+
+
+def _sheets_error_json():
+    return jsonify({"ok": False, "error": "Sheets not initialized"}), 500
+
+
 # --------------orders------------------
 @app.route("/orders")
+@requires_sheets(lambda: render_template("error.html", message="Sheets not available"))
 def orders():
-    if not sheets:
-        return render_template("error.html", message="Sheets not available")
-
     lists = sheets.load_lists()
     return render_template(
         "orders.html",
@@ -58,12 +166,9 @@ def health():
 
 # ---------------- HOME ----------------
 @app.route("/")
+@requires_sheets(lambda: render_template("error.html", message="Sheets not initialized"))
 def index():
-    if not sheets:
-        return render_template("error.html", message="Sheets not initialized")
-
-    lists = sheets.load_lists()
-    recent_orders = sheets.get_recent_orders(50)
+    lists, recent_orders = sheets.load_home(50)
 
     return render_template(
         "index.html",
@@ -75,12 +180,14 @@ def index():
 
 
 # ---------------- SUBMIT ORDER ----------------
+def _submit_unavailable():
+    flash("Sheets not available", "danger")
+    return redirect(url_for("index"))
+
+
 @app.route("/submit", methods=["POST"])
+@requires_sheets(_submit_unavailable)
 def submit():
-    if not sheets:
-        flash("Sheets not available", "danger")
-        return redirect(url_for("index"))
-
     company = request.form.get("company", "").strip()
     includes_gst = request.form.get("includes_gst") == "on"
 
@@ -89,119 +196,125 @@ def submit():
         return redirect(url_for("index"))
 
     # ---------------- BUILD ORDER LINES ----------------
-    order_lines = []
-
-    for key in request.form:
-        if not key.startswith("orders[") or "[product]" not in key:
-            continue
-
-        idx = key[key.find("[") + 1 : key.find("]")]
-        product = request.form.get(f"orders[{idx}][product]", "").strip()
-        brand = request.form.get(f"orders[{idx}][brand]", "").strip()
-        qty = request.form.get(f"orders[{idx}][quantity]", "").strip()
-        price = request.form.get(f"orders[{idx}][price]", "").strip()
-
-        if not product or not qty or not price:
-            continue
-
-        try:
-            qty = int(qty)
-            price = float(price)
-            if qty <= 0:
-                continue
-
-            if includes_gst:
-                price = round(price / 1.05, 4)
-
-            order_lines.append((product, brand, qty, price))
-        except ValueError:
-            continue
+    order_lines = parse_orders(
+        request.form.items(),
+        gst_divisor=1.05 if includes_gst else 1.0
+    )
 
     if not order_lines:
         flash("No valid order items", "warning")
         return redirect(url_for("index"))
 
     # ---------------- DEDUPLICATION ----------------
-    now = time.time()
-
     # Create stable fingerprint (order-insensitive)
-    fingerprint_data = (
-        company,
-        tuple(sorted((p, b, q, pr) for p, b, q, pr in order_lines))
-    )
-
-    fingerprint = hashlib.sha256(
-        repr(fingerprint_data).encode()
-    ).hexdigest()
+    h = hashlib.blake2b(company.encode(), digest_size=16)
+    for product, brand, qty, price in sorted(order_lines):
+        h.update(b"\x00%b\x00%b\x00%d\x00%a" % (product.encode(), brand.encode(), qty, price))
 
-    for ts, fp in list(_recent_submissions):
-        if fp == fingerprint and now - ts < DEDUP_WINDOW:
-            return redirect(url_for("index"))
-
-    _recent_submissions.append((now, fingerprint))
+    fingerprint = h.digest()
+    if _seen_recently(fingerprint):
+        return redirect(url_for("index"))
 
     # ---------------- WRITE TO SHEET ----------------
-    success = 0
+    # Synchronous, like /dispatch/save: success is only reported once the
+    # rows have landed, and the redirected home page already shows them
+    try:
+        sheets.add_orders_batch(company, order_lines)
+    except Exception as e:
+        print("Order error:", e)
+        _forget(fingerprint)  # let the user retry straight away
+        flash("Orders could not be saved, please try again", "danger")
+        return redirect(url_for("index"))
 
-    for product, brand, qty, price in order_lines:
-        try:
-            sheets.add_order(
-                company=company,
-                product=product,
-                brand=brand,
-                quantity=qty,
-                price=price
-            )
-            success += 1
-        except Exception as e:
-            print("Order error:", e)
-
-    if success:
-        flash(f"{success} orders added successfully", "success")
+    flash(f"{len(order_lines)} orders added successfully", "success")
 
     return redirect(url_for("index"))
 
 
 # ---------------- APIs ----------------
+LIST_MAX_AGE = 30  # seconds browsers may reuse product/company lists
+
+
+# name -> (source list, encoded body, etag); reused while the
+# Sheets cache keeps handing back the same list object
+_list_payloads = {}
+
+
+def _list_response(name, items):
+    """{name: items} as JSON with an ETag; answers If-None-Match with 304."""
+    cached = _list_payloads.get(name)
+    if cached is None or cached[0] is not items:
+        body = orjson.dumps({name: items})
+        cached = (items, body, hashlib.blake2b(body, digest_size=8).hexdigest())
+        _list_payloads[name] = cached
+
+    _, body, etag = cached
+    g.list_etag = etag  # lets flask-compress reuse the compressed body
+    resp = app.response_class(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = f"public, max-age={LIST_MAX_AGE}"
+    return resp.make_conditional(request)
+
+
 @app.route("/api/products")
+@requires_sheets(_unavailable_json(products=[]))
 def api_products():
-    return jsonify({"products": sheets.load_lists()["products"] if sheets else []})
+    return _list_response("products", sheets.load_lists()["products"])
 
 
 @app.route("/api/companies")
+@requires_sheets(_unavailable_json(companies=[]))
 def api_companies():
-    return jsonify({"companies": sheets.load_lists()["companies"] if sheets else []})
+    return _list_response("companies", sheets.load_lists()["companies"])
 
 
 @app.route("/api/orders_by_product")
+@requires_sheets(_unavailable_json(orders=[]))
 def api_orders_by_product():
     if rate_limited("pivot"):
         return jsonify({"error": "Rate limit exceeded"}), 429
 
     product = request.args.get("product", "")
-    return jsonify({"orders": sheets.get_orders_by_product(product) if sheets else []})
+    return jsonify({
+        "orders": [o._asdict() for o in sheets.get_orders_by_product(product)]
+    })
 
 
 @app.route("/api/orders_by_party")
+@requires_sheets(_unavailable_json(orders=[]))
 def api_orders_by_party():
     if rate_limited("pivot"):
         return jsonify({"error": "Rate limit exceeded"}), 429
     company = request.args.get("company", "")
-    return jsonify({"orders": sheets.get_orders_by_party(company) if sheets else []})
+    return jsonify({
+        "orders": [o._asdict() for o in sheets.get_orders_by_party(company)]
+    })
+
+
+def _stream_pivot(pivot):
+    """Encodes the pivot JSON one matrix row at a time."""
+    yield (
+        b'{"products":' + orjson.dumps(pivot["products"]) +
+        b',"parties":' + orjson.dumps(pivot["parties"]) +
+        b',"pivot":['
+    )
+    for i, row in enumerate(pivot["pivot"]):
+        yield (b"," if i else b"") + orjson.dumps(row)
+    yield b"]}"
 
 
 @app.route("/api/pivot_data")
+@requires_sheets(_unavailable_json(pivot=[], products=[], parties=[]))
 def api_pivot_data():
     if rate_limited("pivot"):
         return jsonify({"error": "Rate limit exceeded"}), 429
 
-    if not sheets:
-        print ("Sheets not initialized")
-        return jsonify({"pivot": [], "products": [], "parties": []})
-
     pf = request.args.get("product_filter", "")
     cf = request.args.get("party_filter", "")
-    return jsonify(sheets.get_pivot_data(pf, cf))
+    return app.response_class(
+        _stream_pivot(sheets.get_pivot_data(pf, cf)),
+        mimetype="application/json"
+    )
 
 
 # ---------------- DISPATCH ----------------
@@ -211,45 +324,51 @@ def dispatch():
 
 
 @app.route("/dispatch/save", methods=["POST"])
+@requires_sheets(_sheets_error_json)
 def save_dispatch():
-    if not sheets:
-        return jsonify({"ok": False, "error": "Sheets not initialized"}), 500
-
     data = request.get_json(force=True, silent=True)
     if not data or "dispatches" not in data:
         return jsonify({"ok": False, "error": "Invalid payload"}), 400
 
-    written = 0
+    # validate every row first; the write itself is a single append
+    rows = []
+    valid = []
     errors = []
 
     for d in data["dispatches"]:
         try:
-            company= d.get("company", "").strip()
+            company= d.get("company", "").strip()   # company is optional for logging
             serial = str(d.get("order_number", "")).strip()
             product = str(d.get("product", "")).strip()
             qty = int(d.get("quantity", 0))
+        except (AttributeError, TypeError, ValueError) as e:
+            errors.append(str(e))
+            continue
 
-            if not serial or not product or qty <= 0:
-                continue
-
-            sheets.add_dispatch(
-                company=company,              # company is optional for logging
-                product=product,
-                quantity=qty,
-                order_number=serial
-            )
-            written += 1
+        if not serial or not product or qty <= 0:
+            continue
 
-        except Exception as e:
-            errors.append(str(e))
+        rows.append((company, product, qty, serial))
+        valid.append(d)
 
-    if written == 0:
+    if not rows:
         return jsonify({
             "ok": False,
             "error": "No dispatch rows written",
             "details": errors
         }), 400
 
+    try:
+        written = sheets.add_dispatches_batch(rows)
+    except Exception as e:
+        # nothing was written; hand the rows back so the client can retry
+        return jsonify({
+            "ok": False,
+            "error": "Sheets write failed",
+            "details": errors + [str(e)],
+            "dispatches": valid
+        }), 502
+
     return jsonify({
         "ok": True,
         "rows_written": written
@@ -257,31 +376,24 @@ def save_dispatch():
 
 
 @app.route("/api/parties_with_pending")
+@requires_sheets(_unavailable_json(companies=[]))
 def parties_with_pending():
-    if not sheets:
-        return jsonify({"companies": []})
-
-    pivot = sheets.get_pivot_data()
-    return jsonify({"companies": pivot["parties"]})
+    return jsonify({"companies": sheets.get_parties_with_pending()})
 @app.route("/api/products_with_pending")
+@requires_sheets(_unavailable_json(products=[]))
 def products_with_pending():
-    if not sheets:
-        return jsonify({"products": []})
-
-    pivot = sheets.get_pivot_data()
-    return jsonify({"products": pivot["products"]})
+    return jsonify({"products": sheets.get_products_with_pending()})
 
 @app.route("/api/recent_orders")
+@requires_sheets(_unavailable_json(orders=[]))
 def api_recent_orders():
-    if not sheets:
-        return jsonify({"orders": []})
-
     return jsonify({
         "orders": sheets.get_recent_orders_with_row()
     })
 
 
 @app.route("/api/update_order", methods=["POST"])
+@requires_sheets(_sheets_error_json)
 def api_update_order():
     data = request.get_json(force=True)
 
@@ -297,12 +409,14 @@ def api_update_order():
 
 
 @app.route("/api/delete_order", methods=["POST"])
+@requires_sheets(_sheets_error_json)
 def api_delete_order():
     data = request.get_json(force=True)
     sheets.delete_order_row(int(data["row"]))
     return jsonify({"ok": True})
 
 @app.route("/api/undo_delete_order", methods=["POST"])
+@requires_sheets(_sheets_error_json)
 def api_undo_delete_order():
     data = request.get_json(force=True)
 
@@ -312,6 +426,7 @@ def api_undo_delete_order():
     )
     return jsonify({"ok": True})
 @app.route("/api/inventory_requirements")
+@requires_sheets(_unavailable_json(inventory=[]))
 def inventory_requirements():
     print("\n========== INVENTORY REQUIREMENTS DEBUG ==========\n")
 
@@ -323,13 +438,13 @@ def inventory_requirements():
         print(o)
 
     print("\n---- RAW REQUIREMENTS ----")
-    for r in reqs:
+    for r in reqs.values():
         print(r)
 
     # Build product map
     product_map = {}
     print("\n---- BUILDING PRODUCT MAP ----")
-    for r in reqs:
+    for r in reqs.values():
         product = r.get("product")
         width = r.get("width")
         thickness = r.get("thickness")
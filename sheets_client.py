@@ -1,10 +1,16 @@
 import os
 import datetime
+import re
 import gspread
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
 import time
-import random
-from googleapiclient.errors import HttpError
+from collections import OrderedDict, defaultdict, namedtuple
+from functools import lru_cache
+from itertools import islice
 
 
 
@@ -20,6 +26,118 @@ COL_QUANTITY = "Quantity"
 COL_PRICE = "Price"
 COL_BALANCE = "Balance Order"
 
+LIST_SHEETS = ("products", "companies", "brands")
+ORDERS_RANGE = "orders!A:G"      # Serial .. Price
+DISPATCH_RANGE = "dispatch!A:E"  # Date .. Order Number
+# cache key -> the only columns the aggregations read
+SHEET_RANGES = {"orders_rows": ORDERS_RANGE, "dispatch_rows": DISPATCH_RANGE}
+
+# numeric cells come back as numbers, dates still as their displayed text
+RENDER_PARAMS = {
+    "valueRenderOption": "UNFORMATTED_VALUE",
+    "dateTimeRenderOption": "FORMATTED_STRING",
+}
+
+CACHE_SIZE = 64   # entries; least recently used is evicted first
+CACHE_TTL = 15    # seconds (safe)
+LISTS_TTL = 60    # products/companies/brands are never written by the app
+
+# cache names each kind of write makes stale; tuple keys match on key[0]
+ORDER_KEYS = ("orders_rows", "orders_index", "pivot",
+              "parties_with_pending", "products_with_pending")
+DISPATCH_KEYS = ("dispatch_rows", "dispatch_map", "pivot",
+                 "parties_with_pending", "products_with_pending")
+
+# One row of get_orders_by_party/get_orders_by_product; _asdict() for JSON
+Order = namedtuple(
+    "Order", "company product serial ordered dispatched remaining price"
+)
+
+# Names repeat across thousands of rows, so the normalized forms are memoized
+@lru_cache(maxsize=4096)
+def _norm(s):
+    return (s or "").strip().lower().replace(" ", "")
+
+
+@lru_cache(maxsize=4096)
+def _norm_company(s):
+    return (
+        (s or "")
+        .strip()
+        .lower()
+        .replace("&", "and")
+        .replace(" ", "")
+    )
+
+
+def _str(cell):
+    """Text of a cell; unformatted reads return numbers for numeric cells."""
+    if isinstance(cell, str):
+        return cell
+    return "" if cell is None else str(cell)
+
+
+_NUM_RE = re.compile(r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)")
+
+
+def _to_int(cell):
+    """
+    int(float(cell)) for a numeric cell (number, or numeric text),
+    None for blanks and anything float() rejects.
+    """
+    if isinstance(cell, (int, float)):
+        return int(cell)
+    cell = (cell or "").strip()
+    if _NUM_RE.fullmatch(cell):
+        return int(float(cell))
+    if not cell:
+        return None
+    try:  # rarer spellings float() also takes: "1e3", "1_000", ...
+        return int(float(cell))
+    except (ValueError, OverflowError):
+        return None
+
+
+def _filter_re(csv_filter):
+    """
+    One compiled alternation for a comma-separated substring filter
+    (matched against lowercased text); None when the filter is empty.
+    """
+    terms = [p for p in csv_filter.lower().split(",") if p]
+    if not terms:
+        return None
+    return re.compile("|".join(map(re.escape, terms)))
+
+
+def _pivot_matrix(data, parties, products):
+    """
+    Dense party x product rows from data[party][product] sums;
+    only the filled cells are visited.
+    """
+    product_idx = {p: i for i, p in enumerate(products)}
+    pivot = []
+    for party in parties:
+        row = [0] * len(products)
+        for product, qty in data[party].items():
+            row[product_idx[product]] = qty
+        pivot.append(row)
+    return pivot
+
+
+class _SheetsRetry(Retry):
+    """
+    Rate limits (429) are retried for every method, since a throttled
+    request was never applied. Other retryable statuses and read errors are
+    only retried for idempotent methods: a POST append may already have
+    landed, and the Sheets API has no idempotency keys to dedupe a replay.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and not self._is_method_retryable(method):
+            return bool(self.total)
+        return super().is_retry(method, status_code, has_retry_after)
+
+
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive"
@@ -27,260 +145,306 @@ SCOPES = [
 
 
 class SheetsClient:
-    def _retry(self, fn, retries=3):
-        for i in range(retries):
-            try:
-                return fn()
-            except HttpError as e:
-                if i == retries - 1:
-                    raise
-                sleep = (2 ** i) + random.random()
-                time.sleep(sleep)
+    # the module-level memoized normalizers, still reachable as methods
+    _norm = staticmethod(_norm)
+    _norm_company = staticmethod(_norm_company)
 
     def __init__(self):
         creds = Credentials.from_service_account_file(
             SERVICE_ACCOUNT_FILE, scopes=SCOPES
         )
-        self.client = gspread.authorize(creds)
-        self.sheet = self.client.open_by_key(SHEET_ID).worksheet("orders")
-        self.requirements_sheet = self.client.open_by_key(SHEET_ID).worksheet("requirement")
-        
-        self._cache = {}
-        self._cache_ttl = 15  # seconds (safe)
 
-        try:
-            self.dispatch_ws = self.client.open_by_key(SHEET_ID).worksheet("dispatch")
-        except:
-            self.dispatch_ws = self.client.open_by_key(SHEET_ID).add_worksheet(
+        # one pooled keep-alive session for every Sheets call
+        session = AuthorizedSession(creds)
+        session.mount("https://", HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=_SheetsRetry(
+                total=4,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                raise_on_status=False,  # let gspread raise APIError with the body
+            )
+        ))
+        self.client = gspread.Client(creds, session=session)
+        # one metadata fetch resolves every worksheet
+        self._ss = self.client.open_by_key(SHEET_ID)
+        wsmap = {ws.title: ws for ws in self._ss.worksheets()}
+        self.sheet = wsmap["orders"]
+        self.requirements_sheet = wsmap["requirement"]
+
+        self._cache = OrderedDict()  # key -> (value, expires_at)
+        self._cache_lock = threading.Lock()
+        self._order_rows_lock = threading.Lock()  # see add_orders_batch
+
+        self.dispatch_ws = wsmap.get("dispatch")
+        if self.dispatch_ws is None:
+            self.dispatch_ws = self._ss.add_worksheet(
                 title="dispatch", rows=1000, cols=10
             )
             self.dispatch_ws.append_row(
                 ["Date", "Company", "Product", "Quantity", "Order Number"]
             )
-    def _cached(self, key, fn):
-        now = time.time()
+    def _peek(self, key):
+        """Cached value for key if still fresh, else None."""
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[1]:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[0]
+
+    def _store(self, key, value, ttl=CACHE_TTL):
+        with self._cache_lock:
+            self._cache[key] = (value, time.monotonic() + ttl)
+            self._cache.move_to_end(key)
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _cached(self, key, fn, ttl=CACHE_TTL):
+        value = self._peek(key)
+        if value is None:
+            value = fn()
+            self._store(key, value, ttl)
+        return value
 
-        if key in self._cache:
-            value, ts = self._cache[key]
-            if now - ts < self._cache_ttl:
-                return value
+    def _invalidate(self, names):
+        """Drops cache entries whose name (key, or key[0] for tuples) is in names."""
+        with self._cache_lock:
+            for key in [
+                k for k in self._cache
+                if (k[0] if isinstance(k, tuple) else k) in names
+            ]:
+                del self._cache[key]
 
-        value = fn()
-        self._cache[key] = (value, now)
-        return value
-    def _invalidate_cache(self):
-        self._cache.clear()
+    def _sheet_rows(self, key):
+        """
+        Cached rows of the orders ("orders_rows") or dispatch ("dispatch_rows")
+        sheet. Whichever of the two is stale is re-read in one batchGet
+        limited to the columns in SHEET_RANGES.
+        """
+        rows = self._peek(key)
+        if rows is None:
+            missing = {k: r for k, r in SHEET_RANGES.items() if self._peek(k) is None}
+            fetched = self.batch_fetch(list(missing.values()))
+            for k, r in missing.items():
+                self._store(k, fetched[r])
+            rows = fetched[SHEET_RANGES[key]]
+        return rows
 
 
     # ---------------- LOAD LISTS ----------------
     def load_lists(self):
-        ss = self.client.open_by_key(SHEET_ID)
-        out = {"products": [], "companies": [], "brands": []}
+        return self._cached("lists", self._load_lists, LISTS_TTL)
+
+    def batch_fetch(self, ranges):
+        """
+        Reads several A1 ranges in one values.batchGet call, numbers
+        unformatted (see RENDER_PARAMS).
+        Returns {range: rows} keyed by the ranges as passed in.
+        """
+        resp = self._ss.values_batch_get(list(ranges), params=RENDER_PARAMS)
+        return {
+            r: vr.get("values", [])
+            for r, vr in zip(ranges, resp.get("valueRanges", []))
+        }
+
+    def _lists_from(self, fetched):
+        return {
+            k: [_str(r[0]) if r else "" for r in fetched[f"{k}!A:A"][1:]]
+            for k in LIST_SHEETS
+        }
 
-        for k in out.keys():
+    def _load_lists(self):
+        try:
+            return self._lists_from(self.batch_fetch([f"{k}!A:A" for k in LIST_SHEETS]))
+        except Exception:
+            pass  # a list sheet is missing; load the ones that exist
+
+        # same read (and value rendering) per sheet, so both paths agree
+        fetched = {}
+        for k in LIST_SHEETS:
+            a1 = f"{k}!A:A"
             try:
-                ws = ss.worksheet(k)
-                out[k] = ws.col_values(1)[1:]
-            except:
-                pass
+                fetched.update(self.batch_fetch([a1]))
+            except Exception:
+                fetched[a1] = []
 
-        return out
-    def _norm_company(self, s):
-        return (
-            (s or "")
-            .strip()
-            .lower()
-            .replace("&", "and")
-            .replace(" ", "")
-        )
-    
+        return self._lists_from(fetched)
 
     # ---------------- DISPATCH ----------------
     def add_dispatch(self, company, product, quantity, order_number):
-        self.dispatch_ws.append_row([
-            datetime.date.today().isoformat(),
-            company,
-            product,
-            quantity,
-            order_number
-        ], value_input_option="USER_ENTERED")
-        self._invalidate_cache()
+        self.add_dispatches_batch([(company, product, quantity, order_number)])
+
+    def add_dispatches_batch(self, dispatches):
+        """
+        Append several dispatch rows in a single API call.
+        dispatches = iterable of (company, product, quantity, order_number)
+        """
+        today = datetime.date.today().isoformat()
+        rows = [
+            [today, company, product, quantity, order_number]
+            for company, product, quantity, order_number in dispatches
+        ]
+        if not rows:
+            return 0
+
+        self.dispatch_ws.append_rows(rows, value_input_option="USER_ENTERED")
+        self._invalidate(DISPATCH_KEYS)
+        return len(rows)
 
     # ---------------- AGGREGATIONS ----------------
     def _dispatch_map(self):
-        rows = self.dispatch_ws.get_all_values()
-        dispatch = {}
+        return self._cached("dispatch_map", self._build_dispatch_map)
+
+    def _build_dispatch_map(self):
+        rows = self._sheet_rows("dispatch_rows")
+        dispatch = defaultdict(int)  # callers only read it with .get()
+        # locals: this loop runs once per dispatch row
+        str_, norm, to_int = _str, _norm, _to_int
 
         for r in rows[1:]:
             if len(r) < 5:
                 continue
 
-            serial = (r[4] or "").strip()
-            product = self._norm(r[2])
+            serial = str_(r[4]).strip()
+            product = norm(str_(r[2]))
 
-            try:
-                qty = int(float(r[3]))
-            except Exception:
+            qty = to_int(r[3])
+            if qty is None:
                 continue
 
             if not serial or not product:
                 continue
 
-            key = (serial, product)
-            dispatch[key] = dispatch.get(key, 0) + qty
+            dispatch[(serial, product)] += qty
 
         return dispatch
 
 
 
-    def get_orders_by_party(self, company):
-        dispatch = self._dispatch_map()
-        out = []
-
-        rows = self._cached("orders_rows", lambda: self.sheet.get_all_values())
-
+    def _indexed_orders(self):
+        return self._cached("orders_index", self._build_orders_index)
 
-        for r in rows[1:]:
+    def _build_orders_index(self):
+        """
+        Order rows parsed once per cache window:
+        rows        = list of dicts with stripped/lowered/normalized names
+                      and an int quantity, so callers never re-parse cells
+        by_company  = normalized company -> rows
+        by_product  = normalized product -> rows
+        """
+        rows = []
+        by_company = defaultdict(list)
+        by_product = defaultdict(list)
+        # locals: this loop runs once per order row
+        append = rows.append
+        str_, norm, norm_company, to_int = _str, _norm, _norm_company, _to_int
+
+        for r in self._sheet_rows("orders_rows")[1:]:
             if len(r) < 6:
                 continue
 
-            serial = (r[0] or "").strip()
-            party = (r[2] or "").strip()
-            product = r[3] or ""
-
-            if self._norm_company(party) != self._norm_company(company):
-                continue
-
-            try:
-                ordered = int(float(r[5]))
-            except Exception:
-                ordered = 0
-
-            dispatched = dispatch.get((serial, self._norm(product)), 0)
-            remaining = ordered - dispatched
-
-            # 🔑 THIS LINE FIXES "already dispatched but still visible"
-            if remaining <= 0:
-                continue
+            ordered = to_int(r[5]) or 0
 
-            out.append({
-                "company": party,
+            company = str_(r[2]).strip()
+            product = str_(r[3])
+            company_n = norm_company(company)
+            product_n = norm(product)
+            row = {
+                "serial": str_(r[0]).strip(),
+                "date": str_(r[1]).strip(),
+                "company": company,
                 "product": product,
-                "serial": serial,
+                "brand": str_(r[4]) if len(r) > 4 else "",
+                "company_lower": company.lower(),
+                "product_lower": product.lower(),
+                "company_norm": company_n,
+                "product_norm": product_n,
                 "ordered": ordered,
-                "dispatched": dispatched,
-                "remaining": remaining,
                 "price": r[6] if len(r) > 6 else ""
-            })
+            }
 
-        return out
+            append(row)
+            by_company[company_n].append(row)
+            by_product[product_n].append(row)
 
+        return {"rows": rows, "by_company": by_company, "by_product": by_product}
 
-    def get_orders_by_product(self, product):
-        dispatch = self._dispatch_map()
+    def _remaining_orders(self, matches):
+        get = self._dispatch_map().get
         out = []
 
-        target = self._norm(product)
-        rows = self._cached("orders_rows", lambda: self.sheet.get_all_values())
-
-
-        for r in rows[1:]:
-            if len(r) < 6:
-                continue
-
-            serial = (r[0] or "").strip()
-            prod = r[3] or ""
-
-            if self._norm(prod) != target:
-                continue
-
-            party = r[2] or ""
-
-            try:
-                ordered = int(float(r[5]))
-            except Exception:
-                ordered = 0
-
-            dispatched = dispatch.get((serial, target), 0)
-            remaining = ordered - dispatched
+        for o in matches:
+            dispatched = get((o["serial"], o["product_norm"]), 0)
+            remaining = o["ordered"] - dispatched
 
+            # 🔑 THIS LINE FIXES "already dispatched but still visible"
             if remaining <= 0:
                 continue
 
-            out.append({
-                "company": party,          
-                "product": prod,
-                "serial": serial,
-                "ordered": ordered,
-                "dispatched": dispatched,
-                "remaining": remaining,
-                "price": r[6] if len(r) > 6 else ""
-            })
+            out.append(Order(
+                o["company"],
+                o["product"],
+                o["serial"],
+                o["ordered"],
+                dispatched,
+                remaining,
+                o["price"]
+            ))
 
         return out
 
+    def get_orders_by_party(self, company):
+        idx = self._indexed_orders()
+        return self._remaining_orders(
+            idx["by_company"].get(_norm_company(company), [])
+        )
 
-
-
-
+    def get_orders_by_product(self, product):
+        idx = self._indexed_orders()
+        return self._remaining_orders(
+            idx["by_product"].get(_norm(product), [])
+        )
 
     def get_pivot_data(self, product_filter="", party_filter=""):
-        rows = self._cached("orders_rows", lambda: self.sheet.get_all_values())
-
-        dispatch = self._dispatch_map()
-
-        data = {}
-
-        product_filter = product_filter.lower()
-        party_filter = party_filter.lower()
+        return self._cached(
+            ("pivot", product_filter, party_filter),
+            lambda: self._build_pivot_data(product_filter, party_filter)
+        )
 
-        for r in rows[1:]:
-            
+    def _build_pivot_data(self, product_filter, party_filter):
+        get = self._dispatch_map().get
 
-            if len(r) < 6:
-                continue
+        data = defaultdict(lambda: defaultdict(int))  # party -> product -> pending
 
-            # Column mapping
-            serial = r[0]
-            date = r[1]
-            company = r[2].strip()
-            product = r[3]
+        product_re = _filter_re(product_filter)
+        party_re = _filter_re(party_filter)
+        product_search = product_re.search if product_re else None
+        party_search = party_re.search if party_re else None
 
-            if not date.strip():
+        for o in self._indexed_orders()["rows"]:
+            if not o["date"]:
                 continue  # ignore empty rows
 
-            product_filters = [p for p in product_filter.split(",") if p]
-            party_filters = [p for p in party_filter.split(",") if p]
-
-            if product_filters and not any(p in product.lower() for p in product_filters):
+            if product_search and not product_search(o["product_lower"]):
                 continue
 
-            if party_filters and not any(p in company.lower() for p in party_filters):
+            if party_search and not party_search(o["company_lower"]):
                 continue
 
-            try:
-                ordered = int(float(r[5]))
-            except Exception:
-
-                ordered = 0
-
-            dispatched = dispatch.get((serial, self._norm(product)), 0)
-            pending = ordered - dispatched
+            pending = o["ordered"] - get((o["serial"], o["product_norm"]), 0)
             if pending <= 0:
                 continue
 
-            data.setdefault(company, {})
-            data[company][product] = data[company].get(product, 0) + pending
+            data[o["company"]][o["product"]] += pending
 
         products = sorted({p for c in data.values() for p in c})
-        parties = sorted(data.keys())
-
-        pivot = []
-        for party in parties:
-            row = []
-            for product in products:
-                row.append(data[party].get(product, 0))
-            pivot.append(row)
+        parties = sorted(data)
+        pivot = _pivot_matrix(data, parties, products)
 
         return {
             "products": products,
@@ -288,103 +452,155 @@ class SheetsClient:
             "pivot": pivot
         }
 
-    def get_recent_orders(self, limit=50):
-        rows = self._cached("orders_rows", lambda: self.sheet.get_all_values())
+    def _pending_pairs(self):
+        """
+        Yields (company, product) for every order row
+        that still has quantity left to dispatch.
+        """
+        get = self._dispatch_map().get
+
+        for o in self._indexed_orders()["rows"]:
+            if not o["date"]:
+                continue
 
-        if len(rows) <= 1:
-            return []
+            if o["ordered"] - get((o["serial"], o["product_norm"]), 0) > 0:
+                yield o["company"], o["product"]
 
-        data = []
+    def get_parties_with_pending(self):
+        return self._cached(
+            "parties_with_pending",
+            lambda: sorted({company for company, _ in self._pending_pairs()})
+        )
 
-        for r in rows[1:]:
+    def get_products_with_pending(self):
+        return self._cached(
+            "products_with_pending",
+            lambda: sorted({product for _, product in self._pending_pairs()})
+        )
+
+    def load_home(self, limit=50):
+        """
+        Lists + recent orders for the home page. Whatever is not
+        already cached is read in a single batchGet.
+        """
+        ranges = []
+        if self._peek("lists") is None:
+            ranges += [f"{k}!A:A" for k in LIST_SHEETS]
+        if self._peek("orders_rows") is None:
+            ranges.append(ORDERS_RANGE)
+
+        if ranges:
+            try:
+                fetched = self.batch_fetch(ranges)
+            except Exception:
+                fetched = {}  # fall back to the separate loaders below
+
+            if ORDERS_RANGE in fetched:
+                self._store("orders_rows", fetched[ORDERS_RANGE])
+            if "products!A:A" in fetched:
+                self._store("lists", self._lists_from(fetched), LISTS_TTL)
+
+        return self.load_lists(), self.get_recent_orders(limit)
+
+    def _iter_recent(self, total_multiplier=1.0):
+        """
+        Yields (sheet_row, order dict) for each dated row of the cached
+        orders sheet, newest (bottom) first, with
+        total = quantity * price * total_multiplier ("" if either is blank).
+        """
+        rows = self._sheet_rows("orders_rows")
+        for n in range(len(rows) - 1, 0, -1):  # row 0 is the header
+            r = rows[n]
+            i = n + 1  # sheet rows are 1-indexed
             # Column B = Date
-            if len(r) < 2 or not r[1].strip():
+            if len(r) < 2 or not _str(r[1]).strip():
                 continue
 
-            serial = r[0] if len(r) > 0 else ""
+            qty = r[5] if len(r) > 5 else ""
+            price = r[6] if len(r) > 6 else ""
 
-            data.append({
-                "serial": serial,
+            yield i, {
+                "serial": _str(r[0]),
                 "date": r[1],
                 "company": r[2] if len(r) > 2 else "",
                 "product": r[3] if len(r) > 3 else "",
                 "brand": r[4] if len(r) > 4 else "",
-                "quantity": r[5] if len(r) > 5 else "",
-                "price": r[6] if len(r) > 6 else "",
+                "quantity": qty,
+                "price": price,
                 "total": (
-                    float(r[5]) * float(r[6])
-                    if len(r) > 6 and r[5] and r[6]
+                    float(qty) * float(price) * total_multiplier
+                    if qty != "" and price != ""
                     else ""
                 )
-            })
+            }
 
-        data.reverse()
-        return data[:limit]
+    def get_recent_orders(self, limit=50):
+        recent = self._iter_recent()
+        return [order for _, order in islice(recent, limit)]
 
     # ---------------- ADD ORDER ----------------
     def add_order(self, company, product, quantity, price, brand):
+        self.add_orders_batch(company, [(product, brand, quantity, price)])
+
+    def add_orders_batch(self, company, lines):
         """
-        Insert order in the first row where Date column is empty.
+        Insert several order lines for one company in a single write.
+        lines = iterable of (product, brand, quantity, price)
+
+        Each line goes in the next row where Date column is empty.
         Assumes:
         Column A = Serial (already filled / formula)
         Column B = Date
         """
-        sheet = self.sheet
-        all_vals = sheet.get_all_values()
-
-        # Find first empty Date cell (Column B)
-        target_row = None
-        for i in range(1, len(all_vals)):
-            row = all_vals[i]
-            if len(row) < 2 or not row[1].strip():
-                target_row = i + 1  # sheets are 1-indexed
-                break
-
-        if not target_row:
-            target_row = len(all_vals) + 1
+        lines = list(lines)
+        if not lines:
+            return 0
 
+        sheet = self.sheet
         today = datetime.date.today().isoformat()
 
-        # Columns:
-        # B = Date, C = Company, D = Product, E = Brand, F = Quantity, G = Price
-        sheet.update(
-            f"B{target_row}:G{target_row}",
-            [[today, company, product, brand, int(quantity), float(price)]],
-            value_input_option="USER_ENTERED"
-        )
-        
-
-        # ---------------- RECENT ORDERS ----------------
-    def _norm(self, s):
-        return (s or "").strip().lower().replace(" ", "")
-
-
+        # Picking free rows and writing them is a read followed by a
+        # separate write, not an atomic step. The lock keeps this process's
+        # threads from being handed the same rows; other processes writing
+        # to the sheet are not covered, hence the single-worker procfile.
+        with self._order_rows_lock:
+            # Only the Date column decides which rows are free; read it
+            # fresh rather than from the cache
+            dates = sheet.col_values(2)
+
+            # Find empty Date cells (Column B), then continue past the last date
+            target_rows = []
+            for i in range(1, len(dates)):
+                if not dates[i].strip():
+                    target_rows.append(i + 1)  # sheets are 1-indexed
+                    if len(target_rows) == len(lines):
+                        break
+
+            next_row = len(dates) + 1
+            while len(target_rows) < len(lines):
+                target_rows.append(next_row)
+                next_row += 1
+
+            # Columns:
+            # B = Date, C = Company, D = Product, E = Brand, F = Quantity, G = Price
+            sheet.batch_update([
+                {
+                    "range": f"B{target_row}:G{target_row}",
+                    "values": [[today, company, product, brand, int(quantity), float(price)]]
+                }
+                for target_row, (product, brand, quantity, price) in zip(target_rows, lines)
+            ], value_input_option="USER_ENTERED")
+        self._invalidate(ORDER_KEYS)
+
+        return len(lines)
+
+    # ---------------- RECENT ORDERS ----------------
     def get_recent_orders_with_row(self, limit=15):
-        rows = self._cached("orders_rows", lambda: self.sheet.get_all_values())
-        out = []
-
-        for i, r in enumerate(rows[1:], start=2):  # sheet rows are 1-indexed
-            if len(r) < 2 or not r[1].strip():
-                continue
-
-            out.append({
-                "row": i,                  # 👈 IMPORTANT
-                "serial": r[0],
-                "date": r[1],
-                "company": r[2] if len(r) > 2 else "",
-                "product": r[3] if len(r) > 3 else "",
-                "brand": r[4] if len(r) > 4 else "",
-                "quantity": r[5] if len(r) > 5 else "",
-                "price": r[6] if len(r) > 6 else "",
-                "total": (
-                    float(r[5]) * float(r[6]) * 1.05
-                    if len(r) > 6 and r[5] and r[6]
-                    else ""
-                )
-            })
-
-        out.reverse()
-        return out[:limit]
+        recent = self._iter_recent(total_multiplier=1.05)
+        return [
+            {"row": i, **order}  # 👈 IMPORTANT
+            for i, order in islice(recent, limit)
+        ]
 
 
     def update_order_row(self, row, product, brand, quantity, price):
@@ -399,7 +615,7 @@ class SheetsClient:
         value_input_option="USER_ENTERED"
     )
 
-        self._invalidate_cache()
+        self._invalidate(ORDER_KEYS)
 
 
 
@@ -410,7 +626,7 @@ class SheetsClient:
             [["", "", "", "", "", ""]],
             value_input_option="USER_ENTERED"
         )
-        self._invalidate_cache()
+        self._invalidate(ORDER_KEYS)
     def restore_order_row(self, row, data):
         """
         data = dict with keys:
@@ -428,59 +644,50 @@ class SheetsClient:
             ]],
             value_input_option="USER_ENTERED"
         )
-        self._invalidate_cache()
+        self._invalidate(ORDER_KEYS)
     def get_inventory_requirements(self):
-        if "requirements_rows" in self._cache:
-            rows, ts = self._cache["requirements_rows"]
-            if time.time() - ts < self._cache_ttl:
-                return rows
-        rows = self.requirements_sheet.get_all_records()
-        # rows must include: product, width, thickness, weight
-        return rows
+        """
+        Requirement records keyed by product. Each record must include
+        product, width, thickness and weight. The app never writes this
+        sheet, so it is cached as long as the lists are.
+        """
+        return self._cached(
+            "requirements_map",
+            lambda: {
+                r.get("product"): r
+                for r in self.requirements_sheet.get_all_records()
+            },
+            LISTS_TTL
+        )
     def get_pending_orders(self):
         """
         Returns row-level pending orders:
         ordered - dispatched > 0
         """
-        rows = self._cached("orders_rows", lambda: self.sheet.get_all_values())
-        dispatch = self._dispatch_map()
+        get = self._dispatch_map().get
 
         out = []
 
-        for r in rows[1:]:
-            if len(r) < 6:
-                continue
-
-            serial = (r[0] or "").strip()
-            date = (r[1] or "").strip()
-            company = (r[2] or "").strip()
-            product = (r[3] or "").strip()
-            brand = r[4] if len(r) > 4 else ""
-
-            if not date:
+        for o in self._indexed_orders()["rows"]:
+            if not o["date"]:
                 continue  # ignore empty rows
 
-            try:
-                ordered = int(float(r[5]))
-            except Exception:
-                continue
-
-            dispatched = dispatch.get((serial, self._norm(product)), 0)
-            pending = ordered - dispatched
+            dispatched = get((o["serial"], o["product_norm"]), 0)
+            pending = o["ordered"] - dispatched
 
             if pending <= 0:
                 continue
 
             out.append({
-                "serial": serial,
-                "date": date,
-                "company": company,
-                "product": product,
-                "brand": brand,
+                "serial": o["serial"],
+                "date": o["date"],
+                "company": o["company"],
+                "product": o["product"].strip(),
+                "brand": o["brand"],
                 "quantity": pending,
-                "ordered": ordered,
+                "ordered": o["ordered"],
                 "dispatched": dispatched,
-                "price": r[6] if len(r) > 6 else ""
+                "price": o["price"]
             })
 
         return out
@@ -0,0 +1,67 @@
+"""
+Order form parsing for submit().
+
+No Flask imports and fully annotated, so the module can be compiled
+ahead of time (opt-in; mypy is not a runtime dependency):
+
+    pip install mypy
+    mypyc submit_parse.py
+
+The compiled extension is picked up by the same import, and the plain
+.py works unchanged.
+"""
+import re
+from typing import Dict, Iterable, List, Tuple
+
+OrderLine = Tuple[str, str, int, float]
+
+_ORDER_RE = re.compile(r"^orders\[(\d+)\]\[(product|brand|quantity|price)\]$")
+
+
+def parse_orders(form_items: Iterable[Tuple[str, str]], gst_divisor: float = 1.0) -> List[OrderLine]:
+    """
+    Builds (product, brand, quantity, price) lines from
+    orders[<idx>][<field>] form inputs, skipping incomplete/invalid lines.
+    With a gst_divisor other than 1.0, prices are divided by it and
+    rounded to 4 places; otherwise they are kept as entered.
+    """
+    # Group orders[<idx>][<field>] inputs by line in one pass over the form
+    buckets: Dict[str, Dict[str, str]] = {}
+    for key, val in form_items:
+        if not key.startswith("orders["):
+            continue
+        m = _ORDER_RE.match(key)
+        if not m:
+            continue
+        buckets.setdefault(m.group(1), {})[m.group(2)] = val.strip()
+
+    order_lines: List[OrderLine] = []
+
+    for row in buckets.values():
+        product = row.get("product", "")
+        brand = row.get("brand", "")
+        qty_s = row.get("quantity", "")
+        price_s = row.get("price", "")
+
+        if not product or not price_s:
+            continue
+
+        # plain digits only: rejects blanks/negatives/decimals without raising
+        if not (qty_s.isascii() and qty_s.isdigit()):
+            continue
+
+        qty = int(qty_s)
+        if qty <= 0:
+            continue
+
+        try:
+            price = float(price_s)
+        except ValueError:
+            continue
+
+        if gst_divisor != 1.0:
+            price = round(price / gst_divisor, 4)
+
+        order_lines.append((product, brand, qty, price))
+
+    return order_lines